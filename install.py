@@ -1,18 +1,30 @@
 import platform
 import sys
 import os
+import io
 import subprocess
 import tempfile
 import sysconfig
 import zipfile
 import tarfile
 import argparse
-from urllib.request import urlretrieve
+import ctypes
+import errno
+from functools import lru_cache
+from urllib.request import urlopen
 from pathlib import Path
 from ctypes.util import find_library
 
+DOWNLOAD_CHUNK_SIZE = 1 << 20
+PYTHON_VERSIONS = [(3, 12), (3, 11), (3, 10), (3, 9), (3, 8)]
+PROGRESS_BLOCKS = 24
+PROGRESS_BARS = [
+    "█" * downloaded + "░" * (PROGRESS_BLOCKS - downloaded)
+    for downloaded in range(PROGRESS_BLOCKS + 1)
+]
 
-def is_rosetta_translated():
+
+def is_rosetta_translated_sysctl():
     try:
         result = subprocess.run(
             ["sysctl", "-n", "sysctl.proc_translated"], capture_output=True, check=True
@@ -22,9 +34,40 @@ def is_rosetta_translated():
         return False
 
 
+def is_rosetta_translated():
+    try:
+        libc = ctypes.CDLL("libc.dylib", use_errno=True)
+        sysctlbyname = libc.sysctlbyname
+    except (OSError, AttributeError):
+        return is_rosetta_translated_sysctl()
+    sysctlbyname.argtypes = [
+        ctypes.c_char_p,
+        ctypes.c_void_p,
+        ctypes.POINTER(ctypes.c_size_t),
+        ctypes.c_void_p,
+        ctypes.c_size_t,
+    ]
+    sysctlbyname.restype = ctypes.c_int
+    value = ctypes.c_int(0)
+    size = ctypes.c_size_t(ctypes.sizeof(value))
+    result = sysctlbyname(
+        b"sysctl.proc_translated", ctypes.byref(value), ctypes.byref(size), None, 0
+    )
+    if result == 0:
+        return value.value == 1
+    # The key does not exist on machines without Rosetta, which means not translated
+    if ctypes.get_errno() == errno.ENOENT:
+        return False
+    return is_rosetta_translated_sysctl()
+
+
+@lru_cache(maxsize=None)
 def get_python_clib():
     system = platform.system()
-    for major, minor in [(3, 12), (3, 11), (3, 10), (3, 9), (3, 8)]:
+    # find_library may spawn ldconfig/gcc so try the running version first
+    current = sys.version_info[:2]
+    versions = sorted(PYTHON_VERSIONS, key=lambda version: version != current)
+    for major, minor in versions:
         if system == "Windows":
             name = f"python{major}{minor}"
         else:
@@ -78,30 +121,82 @@ def get_release_asset_name():
         raise Exception("Unsupported platform: " + system)
 
 
-def download_progress(count, block_size, total_size):
-    blocks = 24
-    downloaded = int(count * block_size * blocks / total_size)
-    left = int(blocks - downloaded)
-    print(
-        f"\rDownloading ▐{'█' * downloaded}{'░' * left}▌",
-        end="",
-        flush=True,
-    )
+def progress_blocks(downloaded, total_size):
+    return min(downloaded * PROGRESS_BLOCKS // total_size, PROGRESS_BLOCKS)
+
+
+def download_progress(downloaded, total_size):
+    bar = PROGRESS_BARS[progress_blocks(downloaded, total_size)]
+    print(f"\rDownloading ▐{bar}▌", end="", flush=True)
+
+
+class DownloadReader(io.RawIOBase):
+    def __init__(self, response):
+        self.response = response
+        self.total_size = int(response.headers.get("Content-Length") or 0)
+        self.downloaded = 0
+        self.progress = None
+
+    def readable(self):
+        return True
+
+    def readinto(self, buffer):
+        size = self.response.readinto(buffer)
+        self.downloaded += size
+        if self.total_size > 0:
+            # Only redraw when the bar visibly changes
+            progress = progress_blocks(self.downloaded, self.total_size)
+            if progress != self.progress:
+                self.progress = progress
+                download_progress(self.downloaded, self.total_size)
+        return size
+
+
+def download(url, download_path):
+    with urlopen(url) as response, open(download_path, "wb") as f:
+        reader = DownloadReader(response)
+        while True:
+            chunk = reader.read(DOWNLOAD_CHUNK_SIZE)
+            if not chunk:
+                break
+            f.write(chunk)
+
+
+def replace_extracted(extract_dir, install_dir):
+    for root, _, files in os.walk(extract_dir):
+        target_dir = Path(install_dir) / Path(root).relative_to(extract_dir)
+        target_dir.mkdir(parents=True, exist_ok=True)
+        for name in files:
+            os.replace(Path(root) / name, target_dir / name)
+
+
+def download_and_extract_tar(url, install_dir):
+    # Extract into a temporary directory inside the install dir (which is on PATH)
+    # so files can be moved into place atomically and a failed download leaves
+    # the install untouched. A killed run can leave a .aqora-* directory behind.
+    with tempfile.TemporaryDirectory(prefix=".aqora-", dir=install_dir) as extract_dir:
+        with urlopen(url) as response:
+            reader = DownloadReader(response)
+            with tarfile.open(fileobj=reader, mode="r|gz") as tar_ref:
+                tar_ref.extractall(extract_dir)
+            while reader.read(DOWNLOAD_CHUNK_SIZE):
+                pass
+            if reader.total_size > 0 and reader.downloaded != reader.total_size:
+                raise Exception("Download was incomplete")
+        replace_extracted(extract_dir, install_dir)
 
 
 def get_env_path():
     path = os.getenv("PATH")
     if path is None:
-        return []
-    return list(
-        map(Path, filter(lambda path: os.access(path, os.W_OK), path.split(os.pathsep)))
-    )
+        return set()
+    return set(map(Path, path.split(os.pathsep)))
 
 
 def pick_install_dir(dirs):
     env_path = get_env_path()
     for dir in dirs:
-        if dir in env_path:
+        if dir in env_path and os.access(dir, os.W_OK):
             return dir
     return None
 
@@ -145,18 +240,19 @@ def do_install(install_dir):
         raise Exception(f"Cannot write to installation directory: {install_dir}")
     asset_name = get_release_asset_name()
     url = f"https://github.com/aqora-io/cli/releases/latest/download/{asset_name}"
-    with tempfile.TemporaryDirectory() as temp_dir:
-        download_path = Path(temp_dir) / asset_name
-        print(f"Downloading...", end="", flush=True)
-        urlretrieve(url, download_path, download_progress)
-        print(f"\rDownloaded!")
-        if asset_name.endswith(".zip"):
+    print(f"Downloading...", end="", flush=True)
+    if asset_name.endswith(".zip"):
+        # ZIP archives keep their index at the end so they need a seekable file
+        with tempfile.TemporaryDirectory() as temp_dir:
+            download_path = Path(temp_dir) / asset_name
+            download(url, download_path)
+            print(f"\rDownloaded!")
             with zipfile.ZipFile(download_path, "r") as zip_ref:
                 zip_ref.extractall(install_dir)
-        else:
-            with tarfile.open(download_path, "r:gz") as tar_ref:
-                tar_ref.extractall(install_dir)
-        print(f"Installed to {install_dir}!")
+    else:
+        download_and_extract_tar(url, install_dir)
+        print("\rDownloaded!")
+    print(f"Installed to {install_dir}!")
     print("Run `aqora --help` to get started!")
 
 
@@ -5,7 +5,7 @@ use pyo3::{
     intern,
     prelude::*,
     pyclass::IterANextOutput,
-    types::{PyString, PyType},
+    types::{PyBool, PyBytes, PyFloat, PyLong, PyString, PyType},
 };
 use std::fmt;
 use std::{
@@ -403,6 +403,16 @@ pub fn async_generator(generator: PyObject) -> PyResult<impl Stream<Item = PyRes
 }
 
 pub fn deepcopy<'py>(py: Python<'py>, obj: &'py PyAny) -> PyResult<&'py PyAny> {
+    // `copy.deepcopy` returns immutable builtins as is, so skip the call
+    if obj.is_none()
+        || obj.is_exact_instance_of::<PyBool>()
+        || obj.is_exact_instance_of::<PyLong>()
+        || obj.is_exact_instance_of::<PyFloat>()
+        || obj.is_exact_instance_of::<PyString>()
+        || obj.is_exact_instance_of::<PyBytes>()
+    {
+        return Ok(obj);
+    }
     let copy = py
         .import(intern!(py, "copy"))?
         .getattr(intern!(py, "deepcopy"))?;
@@ -4,12 +4,11 @@ use aqora_runner::python::PyEnv;
 use pyo3::{prelude::*, types::PyDict};
 use serde::{de, Deserialize, Serialize};
 use std::{
-    collections::HashMap,
+    collections::{HashMap, HashSet},
     fmt,
     path::{Path, PathBuf},
 };
 use thiserror::Error;
-use tokio::io::AsyncWriteExt;
 
 const PARAMETERS_TAG: &str = "parameters";
 
@@ -214,19 +213,17 @@ async fn notebook_to_script(
     let input_path = input_path.as_ref().to_path_buf();
     let output_path = output_path.as_ref().to_path_buf();
 
-    if tokio::fs::try_exists(&output_path).await.is_ok() {
-        if let Ok((input_meta, output_meta)) = futures::future::try_join(
-            tokio::fs::metadata(&input_path),
-            tokio::fs::metadata(&output_path),
-        )
-        .await
+    if let Ok((input_meta, output_meta)) = futures::future::try_join(
+        tokio::fs::metadata(&input_path),
+        tokio::fs::metadata(&output_path),
+    )
+    .await
+    {
+        if let (Ok(input_modified), Ok(output_modified)) =
+            (input_meta.modified(), output_meta.modified())
         {
-            if let (Ok(input_modified), Ok(output_modified)) =
-                (input_meta.modified(), output_meta.modified())
-            {
-                if input_modified <= output_modified {
-                    return Ok(());
-                }
+            if input_modified <= output_modified {
+                return Ok(());
             }
         }
     }
@@ -274,7 +271,13 @@ async fn notebook_to_script(
     .map_err(|err| NotebookToPythonFunctionError::NbconvertFailed(input_path.clone(), err))?
     .map_err(|err| NotebookToPythonFunctionError::NbconvertFailed(input_path.clone(), err))?;
 
-    tokio::fs::write(&output_path, script)
+    // Write to a partial file first so an interrupted write is never mistaken
+    // for an up to date conversion
+    let partial_path = output_path.with_extension("py.partial");
+    tokio::fs::write(&partial_path, script)
+        .await
+        .map_err(|e| NotebookToPythonFunctionError::Write(partial_path.clone(), e))?;
+    tokio::fs::rename(&partial_path, &output_path)
         .await
         .map_err(|e| NotebookToPythonFunctionError::Write(output_path.clone(), e))?;
 
@@ -406,8 +409,11 @@ async fn convert_notebooks<'a, 'b: 'a>(
         .map(|path| get_meta(env, path).map(|meta| (path, meta)))
         .collect::<Result<Vec<_>, _>>()?;
 
-    let mut to_convert = paths.iter().collect::<Vec<_>>();
-    to_convert.dedup_by_key(|(path, _)| path);
+    let mut seen = HashSet::new();
+    let to_convert = paths
+        .iter()
+        .filter(|(path, _)| seen.insert(&**path))
+        .collect::<Vec<_>>();
 
     let converted =
         futures::future::try_join_all(to_convert.into_iter().map(|(_, meta)| async move {
@@ -437,31 +443,18 @@ async fn convert_notebooks<'a, 'b: 'a>(
 
     futures::future::try_join_all(generated.into_iter().map(
         |(module_path, functions)| async move {
-            let mut module = tokio::fs::File::create(&module_path)
-                .await
-                .map_err(|e| NotebookToPythonFunctionError::Write(module_path.clone(), e))?;
-            module
-                .write_all(
-                    [
-                        "import importlib.util",
-                        "import sys",
-                        "from pathlib import Path",
-                        "",
-                        "dir_path = Path(__file__).resolve().parent",
-                        "",
-                        "",
-                    ]
-                    .join("\n")
-                    .as_bytes(),
-                )
-                .await
-                .map_err(|e| NotebookToPythonFunctionError::Write(module_path.clone(), e))?;
-            module
-                .write_all(functions.join("\n\n").as_bytes())
-                .await
-                .map_err(|e| NotebookToPythonFunctionError::Write(module_path.clone(), e))?;
-            module
-                .flush()
+            let module = [
+                "import importlib.util",
+                "import sys",
+                "from pathlib import Path",
+                "",
+                "dir_path = Path(__file__).resolve().parent",
+                "",
+                "",
+            ]
+            .join("\n")
+                + &functions.join("\n\n");
+            tokio::fs::write(&module_path, module)
                 .await
                 .map_err(|e| NotebookToPythonFunctionError::Write(module_path.clone(), e))?;
             Result::<_, NotebookToPythonFunctionError>::Ok(())